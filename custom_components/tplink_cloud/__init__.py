@@ -9,12 +9,14 @@ from kasa import AuthenticationError
 from pykasacloud import KasaCloud, Token
 
 from homeassistant.components.tplink import create_async_tplink_clientsession
+from homeassistant.config_entries import ConfigEntryState
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryAuthFailed
 import homeassistant.helpers.device_registry as dr
+import homeassistant.util.dt as dt_util
 
-from .const import DEVICE_LIST_INTERVAL, PLATFORMS, TOKEN
-from .coordinator import KasaCloudConfigEntry, KasaCloudCoordinator
+from .const import DEVICE_LIST_INTERVAL, DOMAIN, PLATFORMS, SEED_MAX_AGE, TOKEN
+from .coordinator import KasaCloudConfigEntry, KasaCloudCoordinator, KasaCloudSeed
 from .exceptions import TokenUpdateError
 
 _LOGGER = logging.getLogger(__name__)
@@ -23,6 +25,12 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass: HomeAssistant, entry: KasaCloudConfigEntry) -> bool:
     """Set up TPLink Cloud from a config entry."""
 
+    # take the device list handed over by the config flow before anything can fail
+    seed: KasaCloudSeed | None = hass.data.get(DOMAIN, {}).pop(entry.unique_id, None)
+    if seed and seed.created < dt_util.utcnow() - timedelta(minutes=SEED_MAX_AGE):
+        # left behind by a flow whose entry wasn't set up right away
+        seed = None
+
     async def update_token(token: Token) -> None:
         data = entry.data | {TOKEN: token}
         result = hass.config_entries.async_update_entry(
@@ -40,7 +48,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: KasaCloudConfigEntry) ->
     except AuthenticationError as err:
         raise ConfigEntryAuthFailed(err) from err
 
-    coordinator: KasaCloudCoordinator = KasaCloudCoordinator(hass, entry, cloud)
+    coordinator: KasaCloudCoordinator = KasaCloudCoordinator(
+        hass, entry, cloud, seed
+    )
 
     entry.runtime_data = coordinator
 
@@ -66,6 +76,8 @@ async def async_remove_config_entry_device(
     device_entry: dr.DeviceEntry,
 ) -> bool:
     """Delete device if selected from UI."""
+    if config_entry.state is ConfigEntryState.LOADED:
+        config_entry.runtime_data.async_remove_device(device_entry)
     return True
 
 
@@ -7,23 +7,21 @@ import logging
 from typing import Any, cast
 
 from kasa import AuthenticationError
-from pykasacloud.kasacloud import DeviceDict, KasaCloud
+from pykasacloud.kasacloud import DeviceDict, KasaCloud, Token
 import voluptuous as vol
 
-from homeassistant.components.tplink import (
-    DOMAIN as TPLINK_DOMAIN,
-    create_async_tplink_clientsession,
-)
+from homeassistant.components.tplink import create_async_tplink_clientsession
 from homeassistant.config_entries import (
     SOURCE_REAUTH,
-    SOURCE_USER,
     ConfigEntry,
+    ConfigEntryState,
     ConfigFlow,
     ConfigFlowResult,
     OptionsFlow,
 )
 from homeassistant.const import (
     CONF_DEVICE,
+    CONF_DEVICES,
     CONF_NAME,
     CONF_PASSWORD,
     CONF_TOKEN,
@@ -34,6 +32,12 @@ import homeassistant.helpers.device_registry as dr
 from homeassistant.helpers.selector import (
     DurationSelector,
     DurationSelectorConfig,
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
+    SelectOptionDict,
+    SelectSelector,
+    SelectSelectorConfig,
     TextSelector,
     TextSelectorConfig,
     TextSelectorType,
@@ -42,6 +46,7 @@ from homeassistant.helpers.typing import DiscoveryInfoType
 
 from .const import (
     ACCOUNT_ID,
+    CALLS_PER_HOUR,
     CONFIG_ENTRY,
     DEFAULT_DEVICE_INTERVAL,
     DEFAULT_DEVICE_LIST_INTERVAL,
@@ -53,8 +58,14 @@ from .const import (
     KASA_NAME,
     MIN_DEVICE_INTERVAL,
     MIN_DEVICE_LIST_INTERVAL,
+    PRIORITY_DEVICES,
+)
+from .coordinator import (
+    KasaCloudConfigEntry,
+    KasaCloudSeed,
+    async_create_device_placeholder,
+    async_get_device_entry,
 )
-from .coordinator import KasaCloudConfigEntry, async_get_device_entry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -81,6 +92,11 @@ OPTIONS_SCHEMA = vol.Schema(
         ): DurationSelector(
             DurationSelectorConfig(enable_millisecond=False, enable_day=False)
         ),
+        vol.Optional(CALLS_PER_HOUR, default=0): NumberSelector(
+            NumberSelectorConfig(
+                min=0, step=1, mode=NumberSelectorMode.BOX, unit_of_measurement="/h"
+            )
+        ),
     }
 )
 
@@ -103,14 +119,40 @@ class OptionsFlowHandler(OptionsFlow):
                 minutes=MIN_DEVICE_LIST_INTERVAL
             ):
                 errors[DEVICE_LIST_INTERVAL] = "min_interval"
+            # validate budget, it must cover the device list and hourly device polls
+            calls_per_hour: int = int(user_input.get(CALLS_PER_HOUR, 0))
+            user_input[CALLS_PER_HOUR] = calls_per_hour
+            if calls_per_hour and DEVICE_LIST_INTERVAL not in errors:
+                list_calls: float = timedelta(hours=1) / timedelta(
+                    **user_input[DEVICE_LIST_INTERVAL]
+                )
+                if calls_per_hour < list_calls + len(self._get_devices()):
+                    errors[CALLS_PER_HOUR] = "budget_too_low"
+            # device selector isn't shown if the entry isn't loaded
+            user_input.setdefault(
+                PRIORITY_DEVICES, self.config_entry.options.get(PRIORITY_DEVICES, [])
+            )
             if not errors:
                 return self.async_create_entry(data=user_input)
 
+        schema: vol.Schema = OPTIONS_SCHEMA
+        suggested: dict[str, Any] = dict(self.config_entry.options)
+        if devices := self._get_devices():
+            schema = schema.extend(
+                {
+                    vol.Optional(PRIORITY_DEVICES, default=[]): SelectSelector(
+                        SelectSelectorConfig(options=devices, multiple=True)
+                    )
+                }
+            )
+            # drop priority devices that were removed, they would fail validation
+            macs: set[str] = {device["value"] for device in devices}
+            suggested[PRIORITY_DEVICES] = [
+                mac for mac in suggested.get(PRIORITY_DEVICES, []) if mac in macs
+            ]
         return self.async_show_form(
             step_id="init",
-            data_schema=self.add_suggested_values_to_schema(
-                OPTIONS_SCHEMA, self.config_entry.options
-            ),
+            data_schema=self.add_suggested_values_to_schema(schema, suggested),
             description_placeholders={
                 DEVICE_INTERVAL: str(MIN_DEVICE_INTERVAL),
                 DEVICE_LIST_INTERVAL: str(MIN_DEVICE_LIST_INTERVAL),
@@ -120,6 +162,20 @@ class OptionsFlowHandler(OptionsFlow):
             errors=errors,
         )
 
+    def _get_devices(self) -> list[SelectOptionDict]:
+        """Return the devices polled by the loaded config entry."""
+        if self.config_entry.state is not ConfigEntryState.LOADED:
+            return []
+        entry: KasaCloudConfigEntry = self.config_entry
+        return [
+            SelectOptionDict(
+                value=dr.format_mac(data.parent_coordinator.device.mac),
+                label=data.parent_coordinator.device.alias
+                or data.parent_coordinator.device.model,
+            )
+            for data in entry.runtime_data.data
+        ]
+
 
 class TpLinkCloudConfigFlow(ConfigFlow, domain=DOMAIN):
     """Handle a config flow for TPLink Cloud."""
@@ -131,6 +187,9 @@ class TpLinkCloudConfigFlow(ConfigFlow, domain=DOMAIN):
     _kasacloud_entry: KasaCloudConfigEntry
     _discovered_device: DeviceDict
     _mac: str
+    _title: str
+    _token: Token
+    _device_list: list[DeviceDict]
 
     @staticmethod
     @callback
@@ -156,37 +215,96 @@ class TpLinkCloudConfigFlow(ConfigFlow, domain=DOMAIN):
                     username=user_input[CONF_USERNAME],
                     password=user_input[CONF_PASSWORD],
                 )
-                await self.async_set_unique_id(str(cloud.token[ACCOUNT_ID]))
-                await cloud.close()
-                if self.source == SOURCE_USER:
-                    # Default options
-                    options: dict[str, Any] = {
-                        DEVICE_INTERVAL: {"seconds": DEFAULT_DEVICE_INTERVAL},
-                        DEVICE_LIST_INTERVAL: {"minutes": DEFAULT_DEVICE_LIST_INTERVAL},
-                    }
-                    self._abort_if_unique_id_configured()
-                    return self.async_create_entry(
-                        title=f"Account {user_input[CONF_USERNAME]}",
-                        data={CONF_TOKEN: cloud.token},
-                        options=options,
-                    )
-                if self.source == SOURCE_REAUTH:
-                    entry = self._get_reauth_entry()
-                    return self.async_update_reload_and_abort(
-                        entry,
-                        title=f"Account {user_input[CONF_USERNAME]}",
-                        data={CONF_TOKEN: cloud.token},
-                    )
-
+                try:
+                    self._token = cloud.token
+                    # keep the device list so setup doesn't need to fetch it again
+                    self._device_list = await cloud.get_device_list()
+                finally:
+                    await cloud.close()
             except AuthenticationError:
                 _LOGGER.exception("Authentication error")
                 errors["base"] = "auth_error"
             except Exception:
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
+            else:
+                await self.async_set_unique_id(str(self._token[ACCOUNT_ID]))
+                self._title = f"Account {user_input[CONF_USERNAME]}"
+                if self.source == SOURCE_REAUTH:
+                    self._abort_if_unique_id_mismatch()
+                    entry = self._get_reauth_entry()
+                    if entry.disabled_by is None:
+                        # the reload will set up the entry
+                        self._seed_device_list([])
+                    return self.async_update_reload_and_abort(
+                        entry,
+                        title=self._title,
+                        data={CONF_TOKEN: self._token},
+                    )
+                self._abort_if_unique_id_configured()
+                if self._get_new_devices():
+                    return await self.async_step_devices()
+                return self._async_create_kasacloud_entry([])
 
         return self.async_show_form(data_schema=STEP_USER_DATA_SCHEMA, errors=errors)
 
+    async def async_step_devices(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Select the devices to add with the account."""
+        if user_input is not None:
+            # another flow may have added the account while devices were selected
+            self._abort_if_unique_id_configured()
+            return self._async_create_kasacloud_entry(user_input[CONF_DEVICES])
+
+        options: list[SelectOptionDict] = [
+            SelectOptionDict(
+                value=dr.format_mac(device[KASA_MAC]),
+                label=(
+                    f"{device.get('alias', device[KASA_NAME])} ({device[KASA_MODEL]})"
+                ),
+            )
+            for device in self._get_new_devices()
+        ]
+        return self.async_show_form(
+            step_id="devices",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_DEVICES, default=[]): SelectSelector(
+                        SelectSelectorConfig(options=options, multiple=True)
+                    )
+                }
+            ),
+        )
+
+    def _get_new_devices(self) -> list[DeviceDict]:
+        """Return the cloud devices not registered by any config entry."""
+        return [
+            device
+            for device in self._device_list
+            if async_get_device_entry(self.hass, device) is None
+        ]
+
+    def _seed_device_list(self, selected: list[str]) -> None:
+        """Hand the device list over to the first refresh of the entry."""
+        self.hass.data.setdefault(DOMAIN, {})[self.unique_id] = KasaCloudSeed(
+            device_list=self._device_list, selected=selected
+        )
+
+    @callback
+    def _async_create_kasacloud_entry(self, selected: list[str]) -> ConfigFlowResult:
+        """Create the account entry with the default options."""
+        options: dict[str, Any] = {
+            DEVICE_INTERVAL: {"seconds": DEFAULT_DEVICE_INTERVAL},
+            DEVICE_LIST_INTERVAL: {"minutes": DEFAULT_DEVICE_LIST_INTERVAL},
+        }
+        self._seed_device_list(selected)
+        return self.async_create_entry(
+            title=self._title,
+            data={CONF_TOKEN: self._token},
+            options=options,
+        )
+
     async def async_step_integration_discovery(
         self, discovery_info: DiscoveryInfoType
     ) -> ConfigFlowResult:
@@ -223,15 +341,8 @@ class TpLinkCloudConfigFlow(ConfigFlow, domain=DOMAIN):
         """Confirm discovery."""
         if user_input is not None:
             # create a device placeholder
-            dr.async_get(self.hass).async_get_or_create(
-                config_entry_id=self._kasacloud_entry.entry_id,
-                identifiers={
-                    (TPLINK_DOMAIN, self._mac),
-                    (TPLINK_DOMAIN, self._mac.upper()),
-                },
-                name=self._discovered_device.get(
-                    "alias", self._discovered_device[KASA_NAME]
-                ),
+            async_create_device_placeholder(
+                self.hass, self._kasacloud_entry.entry_id, self._discovered_device
             )
             return self.async_update_reload_and_abort(
                 self._kasacloud_entry, reason="device_added"
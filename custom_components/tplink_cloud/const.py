@@ -15,7 +15,13 @@ MIN_DEVICE_LIST_INTERVAL = 1  # minute
 DEVICE_INTERVAL = "device_interval"
 DEFAULT_DEVICE_INTERVAL = 60  # seconds
 MIN_DEVICE_INTERVAL = 5  # seconds
+CALLS_PER_HOUR = "calls_per_hour"
+PRIORITY_DEVICES = "priority_devices"
+PRIORITY_WEIGHT = 3
+RECENT_COMMAND_WEIGHT = 2
+RECENT_COMMAND_WINDOW = 15  # minutes
 REFRESH_TOKEN = "refresh_token"
+SEED_MAX_AGE = 5  # minutes
 PLATFORMS: list[Platform] = [
     Platform.BINARY_SENSOR,
     Platform.LIGHT,
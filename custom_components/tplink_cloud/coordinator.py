@@ -1,8 +1,14 @@
 """Coordinators for Kasa Cloud."""
 
+from __future__ import annotations
+
+from collections import deque
 from collections.abc import Callable, Coroutine
-from datetime import timedelta
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 import logging
+import math
 from typing import Any, cast
 
 from kasa import AuthenticationError, Device, KasaException
@@ -16,13 +22,16 @@ from homeassistant.components.tplink import (
 )
 from homeassistant.config_entries import SOURCE_INTEGRATION_DISCOVERY, ConfigEntry
 from homeassistant.const import CONF_DEVICE, CONF_MAC
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers import discovery_flow
 import homeassistant.helpers.device_registry as dr
+from homeassistant.helpers.event import async_track_point_in_utc_time
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+import homeassistant.util.dt as dt_util
 
 from .const import (
+    CALLS_PER_HOUR,
     CONFIG_ENTRY,
     DEFAULT_DEVICE_INTERVAL,
     DEFAULT_DEVICE_LIST_INTERVAL,
@@ -30,6 +39,12 @@ from .const import (
     DEVICE_LIST_INTERVAL,
     DOMAIN,
     KASA_MAC,
+    KASA_NAME,
+    MIN_DEVICE_INTERVAL,
+    PRIORITY_DEVICES,
+    PRIORITY_WEIGHT,
+    RECENT_COMMAND_WEIGHT,
+    RECENT_COMMAND_WINDOW,
 )
 from .exceptions import CloudConnectionError
 
@@ -38,6 +53,22 @@ _LOGGER = logging.getLogger(__name__)
 
 type KasaCloudConfigEntry = ConfigEntry[KasaCloudCoordinator]
 
+_CALL_POLL = "poll"
+_CALL_REFRESH = "refresh"
+# what a cloud call made by a device is part of, None for commands
+_CALL_SOURCE: ContextVar[str | None] = ContextVar(
+    "tplink_cloud_call_source", default=None
+)
+
+
+@dataclass
+class KasaCloudSeed:
+    """Device list fetched by the config flow for the first refresh."""
+
+    device_list: list[DeviceDict]
+    selected: list[str] = field(default_factory=list)
+    created: datetime = field(default_factory=dt_util.utcnow)
+
 
 class TPLinkConfigEntrySkelaton:
     """Helper class to allow us to reuse code in Platform setups."""
@@ -66,19 +97,178 @@ def async_get_device_entry(
     return device
 
 
+@callback
+def async_create_device_placeholder(
+    hass: HomeAssistant, entry_id: str, device_dict: DeviceDict
+) -> None:
+    """Create a device placeholder so the device is set up with the entry."""
+    mac: str = dr.format_mac(device_dict[KASA_MAC])
+    dr.async_get(hass).async_get_or_create(
+        config_entry_id=entry_id,
+        identifiers={
+            (TPLINK_DOMAIN, mac),
+            (TPLINK_DOMAIN, mac.upper()),
+        },
+        name=device_dict.get("alias", device_dict[KASA_NAME]),
+    )
+
+
+def allocate_call_budget(
+    device_calls: float, weights: dict[str, float]
+) -> dict[str, timedelta]:
+    """Split the hourly device calls into per-device poll intervals.
+
+    The calls are shared between the devices proportionally to their weight.
+    """
+    if not weights:
+        return {}
+    hour: timedelta = timedelta(hours=1)
+    total_weight: float = sum(weights.values())
+    return {
+        device_id: timedelta(
+            seconds=max(
+                math.ceil(
+                    hour.total_seconds() * total_weight / (device_calls * weight)
+                ),
+                MIN_DEVICE_INTERVAL,
+            )
+        )
+        for device_id, weight in weights.items()
+    }
+
+
+class KasaCloudDeviceCoordinator(TPLinkDataUpdateCoordinator):
+    """Device coordinator that tracks the cloud calls made outside of its polls."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        device: Device,
+        update_interval: timedelta,
+        config_entry: TPLinkConfigEntry,
+        plan_callback: Callable[[], None],
+        parent_coordinator: TPLinkDataUpdateCoordinator | None = None,
+    ) -> None:
+        """Initialize the device coordinator."""
+        self._plan_callback = plan_callback
+        self._refresh_due: datetime | None = None
+        # interval used when no call budget is set
+        self.default_interval: timedelta = update_interval
+        # cloud calls made outside of the scheduled polls, pruned by the planner
+        self.calls: deque[datetime] = deque()
+        self.last_command: datetime | None = None
+        super().__init__(
+            hass=hass,
+            device=device,
+            update_interval=update_interval,
+            config_entry=config_entry,
+            parent_coordinator=parent_coordinator,
+        )
+        if parent_coordinator is None:
+            # child devices share the protocol of the parent device
+            self._track_cloud_calls()
+
+    def _track_cloud_calls(self) -> None:
+        query = self.device.protocol.query
+
+        async def _query(*args: Any, **kwargs: Any) -> dict:
+            source: str | None = _CALL_SOURCE.get()
+            if source != _CALL_POLL:
+                now: datetime = dt_util.utcnow()
+                self.calls.append(now)
+                if source is None:
+                    # not part of an update, an entity sent a command
+                    self.last_command = now
+                self._plan_callback()
+            return await query(*args, **kwargs)
+
+        self.device.protocol.query = _query  # type: ignore[method-assign]
+
+    @property
+    def child_coordinators(self) -> list[KasaCloudDeviceCoordinator]:
+        """Return the coordinators polling the children of the device."""
+        return cast(
+            list[KasaCloudDeviceCoordinator], list(self._child_coordinators.values())
+        )
+
+    def get_child_coordinator(self, child: Device) -> TPLinkDataUpdateCoordinator:
+        """Get a child coordinator that is part of the call budget."""
+        if (coordinator := super().get_child_coordinator(child)) is self:
+            return self
+        if not isinstance(coordinator, KasaCloudDeviceCoordinator):
+            coordinator = KasaCloudDeviceCoordinator(
+                hass=self.hass,
+                device=child,
+                update_interval=cast(timedelta, coordinator.update_interval),
+                config_entry=cast(TPLinkConfigEntry, self.config_entry),
+                plan_callback=self._plan_callback,
+                parent_coordinator=self,
+            )
+            self._child_coordinators[child.device_id] = coordinator
+            self._plan_callback()
+        return coordinator
+
+    @callback
+    def async_set_update_interval(self, update_interval: timedelta) -> None:
+        """Set the poll interval, applying it now if the poll would be due sooner."""
+        self.update_interval = update_interval
+        if (
+            self._unsub_refresh
+            and self._refresh_due
+            and dt_util.utcnow() + update_interval < self._refresh_due
+        ):
+            self._schedule_refresh()
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        super()._schedule_refresh()
+        self._refresh_due = (
+            dt_util.utcnow() + self.update_interval
+            if self._unsub_refresh and self.update_interval
+            else None
+        )
+
+    async def _handle_refresh_interval(self, _now: datetime | None = None) -> None:
+        token = _CALL_SOURCE.set(_CALL_POLL)
+        try:
+            await super()._handle_refresh_interval(_now)
+        finally:
+            _CALL_SOURCE.reset(token)
+
+    async def _async_update_data(self) -> None:
+        # refreshes requested by entities are calls outside of the plan
+        token = _CALL_SOURCE.set(_CALL_SOURCE.get() or _CALL_REFRESH)
+        try:
+            await super()._async_update_data()
+        finally:
+            _CALL_SOURCE.reset(token)
+
+
 class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
     """KasaCloud Coordinator for refreshing device list."""
 
     config_entry: KasaCloudConfigEntry
 
     def __init__(
-        self, hass: HomeAssistant, entry: ConfigEntry, cloud: KasaCloud
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        cloud: KasaCloud,
+        seed: KasaCloudSeed | None = None,
     ) -> None:
         """Initialize device list coordiator."""
-        self._poll_interval: dict[str, int] = entry.data.get(
+        self._poll_interval: dict[str, int] = entry.options.get(
             DEVICE_LIST_INTERVAL, {"minutes": DEFAULT_DEVICE_LIST_INTERVAL}
         )
         self.cloud: KasaCloud = cloud
+        # current allocation of the device poll intervals, see diagnostics
+        self.budget_plan: dict[str, Any] = {}
+        self._unsub_budget_change: CALLBACK_TYPE | None = None
+        self._budget_exceeded: bool = False
+        # device list handed over by the config flow, if any
+        self._seed: KasaCloudSeed | None = seed
+        # device list fetched in setup and reused by the first update
+        self._device_list: list[DeviceDict] | None = None
         super().__init__(
             hass,
             _LOGGER,
@@ -92,16 +282,139 @@ class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
         """Set interval between updates."""
         self.update_interval = value
         # update the sub coordinators
+        self.async_update_device_intervals()
+
+    @callback
+    def async_update_device_intervals(self) -> None:
+        """Set the poll interval of the devices, allocating the call budget if set."""
+        if self._unsub_budget_change:
+            self._unsub_budget_change()
+            self._unsub_budget_change = None
+        options = self.config_entry.options
+        calls_per_hour: int | None = options.get(CALLS_PER_HOUR) or None
+        priority: list[str] = options.get(PRIORITY_DEVICES, [])
         poll_interval: timedelta = timedelta(
-            **self.config_entry.options[DEVICE_INTERVAL]
+            **options.get(DEVICE_INTERVAL, {"seconds": DEFAULT_DEVICE_INTERVAL})
         )
+        now: datetime = dt_util.utcnow()
+        hour: timedelta = timedelta(hours=1)
+        # points in time the plan changes: a command stops being recent or a
+        # call stops counting against the last hour
+        changes: list[datetime] = []
+        unplanned_calls: int = 0
+        weights: dict[str, float] = {}
+        coordinators: dict[str, KasaCloudDeviceCoordinator] = {}
         for tplinkdata in self.data:
-            tplinkdata.parent_coordinator.update_interval = poll_interval
+            coordinator = cast(
+                KasaCloudDeviceCoordinator, tplinkdata.parent_coordinator
+            )
+            while coordinator.calls and coordinator.calls[0] + hour <= now:
+                coordinator.calls.popleft()
+            if coordinator.calls:
+                unplanned_calls += len(coordinator.calls)
+                changes.append(coordinator.calls[0] + hour)
+            weight: float = (
+                PRIORITY_WEIGHT
+                if dr.format_mac(coordinator.device.mac) in priority
+                else 1
+            )
+            if coordinator.last_command and (
+                until := coordinator.last_command
+                + timedelta(minutes=RECENT_COMMAND_WINDOW)
+            ) > now:
+                weight *= RECENT_COMMAND_WEIGHT
+                changes.append(until)
+            # strip children are polled separately over the same cloud connection
+            for polled in (coordinator, *coordinator.child_coordinators):
+                coordinators[polled.device.device_id] = polled
+                weights[polled.device.device_id] = weight
+            coordinator.default_interval = poll_interval
+
+        list_calls: float = hour / cast(timedelta, self.update_interval)
+        intervals: dict[str, timedelta]
+        if calls_per_hour:
+            device_calls: float = calls_per_hour - list_calls - unplanned_calls
+            exceeded: bool = device_calls < len(weights)
+            if exceeded and not self._budget_exceeded:
+                _LOGGER.warning(
+                    "Cloud call budget of %s calls/hour can't poll %s devices "
+                    "at least hourly, the budget will be exceeded",
+                    calls_per_hour,
+                    len(weights),
+                )
+            elif self._budget_exceeded and not exceeded:
+                _LOGGER.info("Cloud call budget of %s calls/hour met", calls_per_hour)
+            self._budget_exceeded = exceeded
+            intervals = allocate_call_budget(max(device_calls, len(weights)), weights)
+            if changes:
+                self._unsub_budget_change = async_track_point_in_utc_time(
+                    self.hass, self._async_budget_change, min(changes)
+                )
+        else:
+            self._budget_exceeded = False
+            intervals = {
+                device_id: coordinator.default_interval
+                for device_id, coordinator in coordinators.items()
+            }
+
+        for device_id, coordinator in coordinators.items():
+            coordinator.async_set_update_interval(intervals[device_id])
+
+        self.budget_plan = {
+            CALLS_PER_HOUR: calls_per_hour,
+            "budget_exceeded": self._budget_exceeded,
+            "device_list_calls_per_hour": round(list_calls, 2),
+            "unplanned_calls_last_hour": unplanned_calls,
+            "device_calls_per_hour": round(
+                sum(hour / interval for interval in intervals.values()), 2
+            ),
+            "devices": [
+                {
+                    "name": coordinator.device.alias,
+                    "model": coordinator.device.model,
+                    "weight": weights[device_id],
+                    "interval": intervals[device_id].total_seconds(),
+                }
+                for device_id, coordinator in coordinators.items()
+            ],
+        }
+
+    @callback
+    def _async_budget_change(self, _now: datetime) -> None:
+        self._unsub_budget_change = None
+        self.async_update_device_intervals()
+
+    @callback
+    def async_remove_device(self, device_entry: dr.DeviceEntry) -> None:
+        """Stop polling a device removed from the config entry."""
+        for tplinkdata in self.data:
+            mac: str = dr.format_mac(tplinkdata.parent_coordinator.device.mac)
+            if device_entry.identifiers & {
+                (TPLINK_DOMAIN, mac),
+                (TPLINK_DOMAIN, mac.upper()),
+            }:
+                self.data.remove(tplinkdata)
+                self.config_entry.async_create_task(
+                    self.hass, tplinkdata.parent_coordinator.async_shutdown()
+                )
+                break
+        self.async_update_device_intervals()
 
     async def _async_setup(self) -> None:
-        data: list[DeviceDict] = await self._async_get_device_list()
+        data: list[DeviceDict]
+        if self._seed:
+            data = self._seed.device_list
+            for device in data:
+                if dr.format_mac(device[KASA_MAC]) in self._seed.selected:
+                    async_create_device_placeholder(
+                        self.hass, self.config_entry.entry_id, device
+                    )
+            self._seed = None
+        else:
+            data = await self._async_get_device_list()
+        self._device_list = data
         poll_interval: timedelta = timedelta(
-            **self.config_entry.data.get(
+            **self.config_entry.options.get(
                 DEVICE_INTERVAL, {"seconds": DEFAULT_DEVICE_INTERVAL}
             )
         )
@@ -109,12 +422,13 @@ class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
             if device_entry := async_get_device_entry(self.hass, device):
                 if self.config_entry.entry_id in device_entry.config_entries:
                     kasadevice: Device = await self.cloud.get_device(device)
-                    coordinator: TPLinkDataUpdateCoordinator = (
-                        TPLinkDataUpdateCoordinator(
+                    coordinator: KasaCloudDeviceCoordinator = (
+                        KasaCloudDeviceCoordinator(
                             hass=self.hass,
                             device=kasadevice,
                             update_interval=poll_interval,
                             config_entry=cast(TPLinkConfigEntry, self.config_entry),
+                            plan_callback=self.async_update_device_intervals,
                         )
                     )
                     self.data.append(
@@ -126,6 +440,7 @@ class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
                     )
                 continue
             self._trigger_discover_flow(device)
+        self.async_update_device_intervals()
 
     async def _async_get_device_list(self) -> list[DeviceDict]:
         try:
@@ -165,7 +480,12 @@ class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
         )
 
     async def _async_update_data(self) -> list[TPLinkData]:
-        data: list[DeviceDict] = await self._async_get_device_list()
+        data: list[DeviceDict]
+        if self._device_list is not None:
+            # first refresh, the device list was just fetched in setup
+            data, self._device_list = self._device_list, None
+        else:
+            data = await self._async_get_device_list()
 
         if len(data) != len(self.data):
             # we have new devices?
@@ -177,6 +497,9 @@ class KasaCloudCoordinator(DataUpdateCoordinator[list[TPLinkData]]):
 
     async def async_shutdown(self) -> None:
         """Shutdown the coordinator."""
+        if self._unsub_budget_change:
+            self._unsub_budget_change()
+            self._unsub_budget_change = None
         for data in self.data:
             await data.parent_coordinator.async_shutdown()
         await self.cloud.close()
@@ -0,0 +1,30 @@
+"""Diagnostics support for TPLink Cloud."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.const import CONF_TOKEN
+from homeassistant.core import HomeAssistant
+
+from .const import PRIORITY_DEVICES
+from .coordinator import KasaCloudConfigEntry
+
+TO_REDACT = {CONF_TOKEN, PRIORITY_DEVICES}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: KasaCloudConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    diagnostics: dict[str, Any] = {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+    }
+    if entry.state is ConfigEntryState.LOADED:
+        diagnostics["budget_plan"] = entry.runtime_data.budget_plan
+    return diagnostics